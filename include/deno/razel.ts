@@ -1,12 +1,17 @@
-import {assertEquals} from 'https://deno.land/std@0.135.0/testing/asserts.ts';
+import {assert, assertEquals} from 'https://deno.land/std@0.135.0/testing/asserts.ts';
 import * as path from 'https://deno.land/std@0.135.0/path/mod.ts';
 
 export class Razel {
     private static _instance: Razel;
     static readonly outDir = 'razel-out';
-    private commands: Command[] = [];
+    private commands = new Map<string, Command>();
+    private files = new Map<string, File>();
+    private commandLines = new Map<string, string>();
+    private unclaimedOutputs = new Map<File, number>();
+    private readonly workspacePrefix: string;
 
     private constructor(public readonly workspaceDir: string) {
+        this.workspacePrefix = path.join(workspaceDir, path.SEP);
     }
 
     static init(workspaceDir: string): Razel {
@@ -20,11 +25,11 @@ export class Razel {
     }
 
     addDataFile(path: string): File {
-        return new File(this.relPath(path), true, null);
+        return this.addFile(path, true);
     }
 
     addOutputFile(path: string): File {
-        return new File(this.relPath(path), false, null);
+        return this.addFile(path, false);
     }
 
     addCommand(name: string, executable: string, args: (string | File)[], env?: any): CustomCommand {
@@ -50,38 +55,85 @@ export class Razel {
     }
 
     writeRazelFile() {
-        const json = this.commands.map(x => JSON.stringify(x.json()));
-        Deno.writeTextFileSync(path.join(this.workspaceDir, 'razel.jsonl'), json.join('\n'));
+        const json = [...this.commands.values()].map(x => JSON.stringify(x.json()));
+        const content = json.length ? json.join('\n') + '\n' : '';
+        Deno.writeTextFileSync(path.join(this.workspaceDir, 'razel.jsonl'), content);
     }
 
     private add(command: Command): Command {
-        const existing = this.commands.find(x => x.name === command.name);
+        const existing = this.commands.get(command.name);
         if (existing) {
-            assertEquals(command.commandLine(), existing.commandLine(), `conflicting actions: ${command.name}:\n${existing.commandLine()}\n${command.commandLine()}`);
+            // command lines are only needed on name collisions: build the existing one once
+            let existingLine = this.commandLines.get(command.name);
+            if (existingLine === undefined) {
+                existingLine = existing.commandLine();
+                this.commandLines.set(command.name, existingLine);
+            }
+            const line = command.commandLine();
+            assertEquals(line, existingLine, `conflicting actions: ${command.name}:\n${existingLine}\n${line}`);
+            existing.outputs.forEach(x => this.claimOutput(x));
             return existing;
         }
-        this.commands.push(command);
+        for (const input of command.inputs) {
+            // an output file requested again must be for re-adding its command, not for another producer
+            assert(!this.unclaimedOutputs.has(input),
+                `output file of ${input.createdBy?.name} is also created by ${command.name}: ${input.fileName}`);
+        }
+        command.outputs.forEach(x => this.claimOutput(x));
+        this.commands.set(command.name, command);
         return command;
     }
 
+    private addFile(fileName: string, isData: boolean): File {
+        // relPath() already normalizes absolute paths
+        fileName = path.isAbsolute(fileName) ? this.relPath(fileName) : path.normalize(fileName);
+        let file = this.files.get(fileName);
+        if (file) {
+            assertEquals(file.isData, isData, `file added as data and output file: ${fileName}`);
+        } else {
+            file = new File(fileName, isData, null);
+            this.files.set(fileName, file);
+        }
+        if (!isData) {
+            this.unclaimedOutputs.set(file, (this.unclaimedOutputs.get(file) ?? 0) + 1);
+        }
+        return file;
+    }
+
+    private claimOutput(file: File) {
+        const count = this.unclaimedOutputs.get(file);
+        if (count === undefined) {
+            return;
+        }
+        if (count > 1) {
+            this.unclaimedOutputs.set(file, count - 1);
+        } else {
+            this.unclaimedOutputs.delete(file);
+        }
+    }
+
     private sanitizeName(name: string): string {
-        return name.replaceAll(':', '.'); // target names may not contain ':'
+        // target names may not contain ':'
+        return name.includes(':') ? name.replaceAll(':', '.') : name;
     }
 
     private relPath(fileName: string): string {
         if (!path.isAbsolute(fileName)) {
             return fileName;
         }
+        const normalized = path.normalize(fileName);
+        if (normalized.startsWith(this.workspacePrefix) && !normalized.endsWith(path.SEP)) {
+            return normalized.slice(this.workspacePrefix.length);
+        }
         return path.relative(this.workspaceDir, fileName);
     }
 }
 
 export class File {
-    constructor(public readonly fileName: string, public readonly isData: boolean, public createdBy: Command | null) {
-    }
+    readonly basename: string;
 
-    get basename(): string {
-        return path.basename(this.fileName);
+    constructor(public readonly fileName: string, public readonly isData: boolean, public createdBy: Command | null) {
+        this.basename = path.basename(fileName);
     }
 
     ensureEqual(other: File) {
@@ -94,7 +146,26 @@ export class File {
 }
 
 export abstract class Command {
-    protected constructor(public readonly name: string, public readonly outputs: File[]) {
+    readonly args: readonly (string | File)[];
+    readonly inputs: File[] = [];
+    readonly outputs: File[] = [];
+    protected readonly jsonArgs: string[] = [];
+
+    protected constructor(public readonly name: string, args: (string | File)[]) {
+        this.args = [...args];
+        for (const arg of this.args) {
+            if (!(arg instanceof File)) {
+                this.jsonArgs.push(arg);
+                continue;
+            }
+            this.jsonArgs.push(arg.fileName);
+            if (arg.isData || arg.createdBy) {
+                this.inputs.push(arg);
+            } else {
+                this.outputs.push(arg);
+            }
+        }
+        this.outputs.forEach(x => x.createdBy = this);
     }
 
     get output(): File {
@@ -108,10 +179,8 @@ export abstract class Command {
 }
 
 export class CustomCommand extends Command {
-    constructor(name: string, public readonly executable: string, public readonly args: (string | File)[],
-                public readonly env?: any) {
-        super(name, args.filter(x => (x instanceof File) && !(x as File).isData && !(x as File).createdBy) as File[]);
-        this.outputs.forEach(x => x.createdBy = this);
+    constructor(name: string, public readonly executable: string, args: (string | File)[], public readonly env?: any) {
+        super(name, args);
     }
 
     commandLine(): string {
@@ -125,8 +194,8 @@ export class CustomCommand extends Command {
         return {
             name: this.name,
             executable: this.executable,
-            args: this.args.map(x => x instanceof File ? x.fileName : x),
-            inputs: this.args.filter(x => x instanceof File && x.createdBy !== this).map(x => (x as File).fileName),
+            args: [...this.jsonArgs],
+            inputs: this.inputs.map(x => x.fileName),
             outputs: this.outputs.map(x => x.fileName),
             env: this.env,
         };
@@ -140,9 +209,8 @@ export class Task extends Command {
         return file;
     }
 
-    constructor(name: string, public readonly task: string, public readonly args: (string | File)[]) {
-        super(name, args.filter(x => (x instanceof File) && !(x as File).isData && !(x as File).createdBy) as File[]);
-        this.outputs.forEach(x => x.createdBy = this);
+    constructor(name: string, public readonly task: string, args: (string | File)[]) {
+        super(name, args);
     }
 
     commandLine(): string {
@@ -157,7 +225,7 @@ export class Task extends Command {
         return {
             name: this.name,
             task: this.task,
-            args: this.args.map(x => x instanceof File ? x.fileName : x),
+            args: [...this.jsonArgs],
         };
     }
 }
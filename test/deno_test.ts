@@ -0,0 +1,61 @@
+import {assertEquals, assertStrictEquals, assertThrows} from 'https://deno.land/std@0.135.0/testing/asserts.ts';
+import * as path from 'https://deno.land/std@0.135.0/path/mod.ts';
+import {Razel, Task} from '../include/deno/razel.ts';
+
+// Razel.init() allows a single instance only, use separate ones to test different workspace dirs
+function newRazel(workspaceDir: string): Razel {
+    return new (Razel as any)(workspaceDir);
+}
+
+Deno.test('relPath() equals path.relative()', () => {
+    const fileNames = [
+        '/ws',
+        '/ws/',
+        '/ws/x',
+        '/ws//x',
+        '/ws/./x',
+        '/ws/x/',
+        '/ws/a/../b',
+        '/ws/a/b/c',
+        '/ws/../x',
+        '/wsx/y',
+        '/other/x',
+        '/x',
+    ];
+    for (const workspaceDir of ['/ws', '/ws/', '/']) {
+        const razel = newRazel(workspaceDir);
+        for (const fileName of fileNames) {
+            assertEquals(razel.addDataFile(fileName).fileName, path.relative(workspaceDir, fileName),
+                `workspace: ${workspaceDir}, file: ${fileName}`);
+        }
+    }
+});
+
+Deno.test('same command added twice', () => {
+    const razel = newRazel('/ws');
+    const a = razel.addDataFile('a.csv');
+    const addCopy = () => razel.addCommand('b.csv', 'cmake', ['-E', 'copy', a, razel.addOutputFile('b.csv')]);
+    const command = addCopy();
+    assertStrictEquals(addCopy(), command);
+    const consumer = razel.addCommand('c.csv', 'cmake', ['-E', 'copy', command.output, razel.addOutputFile('c.csv')]);
+    assertEquals(consumer.inputs.length, 1);
+    assertStrictEquals(consumer.inputs[0], command.output);
+});
+
+Deno.test('Task.writeFile() called twice', () => {
+    Razel.init('/ws');
+    const file = Task.writeFile('lines.txt', ['a', 'b']);
+    assertStrictEquals(Task.writeFile('lines.txt', ['a', 'b']), file);
+    assertThrows(() => Task.writeFile('lines.txt', ['c']));
+});
+
+Deno.test('two commands creating the same file', () => {
+    const razel = newRazel('/ws');
+    razel.addTask('x1', 'write-file', [razel.addOutputFile('x.txt'), 'a']);
+    assertThrows(() => razel.addTask('x2', 'write-file', [razel.addOutputFile('x.txt'), 'b']));
+    // both output files requested before adding the commands
+    const y1 = razel.addOutputFile('y.txt');
+    const y2 = razel.addOutputFile('y.txt');
+    razel.addTask('y1', 'write-file', [y1, 'a']);
+    assertThrows(() => razel.addTask('y2', 'write-file', [y2, 'b']));
+});